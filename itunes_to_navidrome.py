@@ -44,19 +44,41 @@ IMPORTANT NOTES:
 """
 
 import sqlite3
-import plistlib
 import sys
 import os
 import unicodedata
 import html
-import string
-import random
-from dataclasses import dataclass
+import base64
+import pickle
+import functools
+import glob
+import itertools
+import re
+import shutil
+from dataclasses import dataclass, fields
 from datetime import datetime
-from urllib.parse import unquote, urlparse
+from urllib.parse import unquote
 import argparse
 import logging
-from collections import defaultdict
+from collections import namedtuple
+from typing import TextIO
+
+# lxml is optional: when installed, Library.xml is read with its faster
+# iterparse, otherwise with the standard library's ElementTree
+try:
+    from lxml import etree
+    ITERPARSE_OPTIONS = {'huge_tree': True}
+except ImportError:
+    import xml.etree.ElementTree as etree
+    ITERPARSE_OPTIONS = {}
+
+# termios/tty are POSIX-only; without them the options screen reads whole
+# lines with input() instead of single keys
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
 
 
 @dataclass
@@ -68,9 +90,33 @@ class ImportOptions:
     import_date_added: bool = False
     import_playlists: bool = False
 
+    def play_data_keys(self) -> tuple:
+        """
+        iTunes track keys for (play count, rating, play date).
+
+        Options that are off map to None, which is never a track key, so a
+        plain dict.get on the key falls back to its default without a branch.
+        """
+        return (
+            'Play Count' if self.import_play_counts else None,
+            'Rating' if self.import_ratings else None,
+            'Play Date UTC' if self.import_play_dates else None,
+        )
+
+
+# ImportOptions flag names in field order; the options screen and the
+# --import-* arguments use the same names and order
+IMPORT_FLAGS = tuple(field.name for field in fields(ImportOptions))
+
 # Logger will be configured in main() after log directory is created
 logger = logging.getLogger(__name__)
 
+# Report progress every N tracks in the per-track loops
+PROGRESS_INTERVAL = 5000
+
+# Matched tracks whose annotation rows are buffered before each executemany flush
+ANNOTATION_BATCH_SIZE = 500
+
 
 def create_log_directory() -> str:
     """
@@ -112,26 +158,40 @@ def setup_logging(log_dir: str, verbose: bool = False):
     logger.setLevel(log_level)
 
 
-def log_and_print(message: str):
-    """Output message to both console and log file."""
-    print(message)
+def log_and_print_lines(messages: list):
+    """
+    Output several messages to the console with one print, and to the log
+    file as a single record.
+    """
+    print('\n'.join(messages))
     # Strip formatting chars for cleaner log output
-    clean_message = message.lstrip('= -').rstrip('= -').strip()
-    if clean_message:
-        logger.info(clean_message)
+    clean_messages = [message.lstrip('= -').rstrip('= -').strip() for message in messages]
+    clean_messages = [message for message in clean_messages if message]
+    if clean_messages:
+        logger.info('\n'.join(clean_messages))
 
 
-def parse_itunes_library(xml_path: str, include_playlists: bool = False):
+def parse_itunes_library(xml_path: str, include_playlists: bool = False, use_cache: bool = False):
     """
     Parse iTunes Library.xml and return track dictionary.
 
     If include_playlists is True, returns (tracks, playlists) tuple.
     Otherwise returns just tracks dict.
+
+    With use_cache (--cache), the parsed library is pickled next to the XML
+    file (Library.xml.pkl) and reused on later runs while it is newer than the
+    XML and was written by this parser version, so a dry run followed by the
+    real run only parses the XML once.
     """
-    logger.info(f"Parsing iTunes library: {xml_path}")
+    library = load_library_cache(xml_path) if use_cache else None
 
-    with open(xml_path, 'rb') as f:
-        library = plistlib.load(f)
+    if library is None:
+        logger.info(f"Parsing iTunes library: {xml_path}")
+
+        library = load_plist_streaming(xml_path)
+
+        if use_cache:
+            save_library_cache(xml_path, library)
 
     tracks = library.get('Tracks', {})
     logger.info(f"Found {len(tracks)} tracks in iTunes library")
@@ -143,6 +203,128 @@ def parse_itunes_library(xml_path: str, include_playlists: bool = False):
     return tracks
 
 
+# Bump when the parsed library's shape changes, so older caches are ignored
+LIBRARY_CACHE_VERSION = 1
+
+
+def library_cache_tag() -> tuple:
+    """Identify the parser output a cache holds: format version and kept track keys."""
+    return (LIBRARY_CACHE_VERSION, tuple(sorted(TRACK_KEYS)))
+
+
+def load_library_cache(xml_path: str):
+    """
+    Return the cached parsed library for xml_path, or None if it is missing,
+    older than the XML, or was written by a different parser version.
+    """
+    cache_path = xml_path + '.pkl'
+    try:
+        if os.path.getmtime(cache_path) < os.path.getmtime(xml_path):
+            logger.debug(f"Library cache is older than {xml_path}, ignoring it")
+            return None
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read library cache {cache_path}: {e}")
+        return None
+
+    if not isinstance(cached, dict) or cached.get('tag') != library_cache_tag():
+        logger.info(f"Library cache {cache_path} is from a different version, re-parsing")
+        return None
+
+    logger.info(f"Loaded iTunes library from cache: {cache_path}")
+    return cached['library']
+
+
+def save_library_cache(xml_path: str, library: dict):
+    """Pickle the parsed library next to xml_path (failures are non-fatal)."""
+    cache_path = xml_path + '.pkl'
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump({'tag': library_cache_tag(), 'library': library}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        logger.warning(f"Could not write library cache {cache_path}: {e}")
+
+
+def plist_date(text: str) -> datetime:
+    """Parse a plist <date> value (always UTC, e.g. 2025-06-25T13:45:30Z)."""
+    return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                    int(text[11:13]), int(text[14:16]), int(text[17:19]))
+
+
+# Converters for plist leaf elements, keyed by tag name
+PLIST_SCALARS = {
+    'string': lambda text: text or '',
+    'integer': int,
+    'real': float,
+    'date': plist_date,
+    'true': lambda text: True,
+    'false': lambda text: False,
+    'data': lambda text: base64.b64decode(text or b''),
+}
+
+
+# The only per-track keys the migration reads; everything else in a track
+# entry (Name, Artist, Kind, Bit Rate, ...) is dropped while parsing
+TRACK_KEYS = frozenset(['Location', 'Play Count', 'Rating', 'Play Date UTC', 'Date Added'])
+
+
+def load_plist_streaming(xml_path: str):
+    """
+    Load an iTunes library plist with iterparse, producing the same structure as plistlib.
+
+    Elements are discarded as soon as their value has been converted, so only
+    the resulting Python objects are held in memory - never the full XML tree.
+    Track entries under Tracks keep only TRACK_KEYS.
+    """
+    containers = []     # stack of [dict_or_list, pending_key]
+    elements = []       # stack of open <dict>/<array> elements
+    root = None
+
+    for event, elem in etree.iterparse(xml_path, events=('start', 'end'), **ITERPARSE_OPTIONS):
+        tag = elem.tag
+
+        if event == 'start':
+            if tag == 'dict':
+                containers.append([{}, None])
+                elements.append(elem)
+            elif tag == 'array':
+                containers.append([[], None])
+                elements.append(elem)
+            continue
+
+        if tag == 'key':
+            containers[-1][1] = elem.text or ''
+        elif (len(containers) == 3 and tag in PLIST_SCALARS
+              and containers[2][1] not in TRACK_KEYS and containers[0][1] == 'Tracks'):
+            # Unused track field (root dict -> Tracks dict -> track dict)
+            pass
+        elif tag in PLIST_SCALARS or tag in ('dict', 'array'):
+            if tag in PLIST_SCALARS:
+                value = PLIST_SCALARS[tag](elem.text)
+            else:
+                value = containers.pop()[0]
+                elements.pop()
+
+            if not containers:
+                root = value
+            elif isinstance(containers[-1][0], dict):
+                containers[-1][0][containers[-1][1]] = value
+            else:
+                containers[-1][0].append(value)
+
+        # Drop consumed elements so the tree never grows
+        if elements:
+            del elements[-1][:]
+        else:
+            elem.clear()
+
+    return root
+
+
 def is_smart_playlist(playlist: dict) -> bool:
     """Check if a playlist is a smart playlist (auto-generated based on rules)."""
     return 'Smart Info' in playlist or 'Smart Criteria' in playlist
@@ -184,19 +366,19 @@ def extract_playlists(library: dict, tracks: dict) -> list:
         # Skip system playlists
         if is_system_playlist(playlist):
             skipped_system += 1
-            logger.debug(f"Skipping system playlist: {name}")
+            logger.debug("Skipping system playlist: %s", name)
             continue
 
         # Skip smart playlists
         if is_smart_playlist(playlist):
             skipped_smart += 1
-            logger.debug(f"Skipping smart playlist: {name}")
+            logger.debug("Skipping smart playlist: %s", name)
             continue
 
         # Get playlist items (track IDs)
         items = playlist.get('Playlist Items', [])
         if not items:
-            logger.debug(f"Skipping empty playlist: {name}")
+            logger.debug("Skipping empty playlist: %s", name)
             continue
 
         # Resolve track IDs to track data
@@ -220,6 +402,26 @@ def extract_playlists(library: dict, tracks: dict) -> list:
     return user_playlists
 
 
+# unicodedata.is_normalized was added in Python 3.8
+NFC_QUICK_CHECK = getattr(unicodedata, 'is_normalized', None)
+
+
+@functools.lru_cache(maxsize=200_000)
+def nfc(text: str) -> str:
+    """
+    NFC-normalize a non-ASCII string.
+
+    Results are memoized: the same path is normalized once when building
+    the index and again for every iTunes track or playlist entry that
+    points at it.
+    """
+    # Quick Check (Python 3.8+): most paths are already NFC, and confirming
+    # that is far cheaper than a full decompose/recompose pass
+    if NFC_QUICK_CHECK is not None and NFC_QUICK_CHECK('NFC', text):
+        return text
+    return unicodedata.normalize('NFC', text)
+
+
 def normalize_unicode(text: str) -> str:
     """
     Normalize Unicode to NFC form.
@@ -228,9 +430,17 @@ def normalize_unicode(text: str) -> str:
     """
     if text is None:
         return None
-    return unicodedata.normalize('NFC', text)
+    # ASCII text is always NFC; skip the normalizer and keep it out of the cache
+    if text.isascii():
+        return text
+    return nfc(text)
 
 
+# Matches the scheme and host of an iTunes location (file://localhost, file://)
+FILE_URL_PREFIX = re.compile(r'^file://[^/]*', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=200_000)
 def extract_path_from_itunes_location(itunes_location: str) -> str:
     """
     Extract and normalize the file path from an iTunes file:// URL.
@@ -240,19 +450,24 @@ def extract_path_from_itunes_location(itunes_location: str) -> str:
         file:///Users/jason/Music/iTunes/iTunes%20Media/Music/Artist/Album/Song.mp3 (Mac)
 
     Returns the decoded, normalized path (without the file:// prefix).
+
+    Results are memoized, so each distinct location is decoded once per run
+    even though the sample, play data, date-added and playlist passes all
+    look up the same tracks.
     """
     if not itunes_location:
         return None
 
-    # Parse the file:// URL
-    parsed = urlparse(itunes_location)
-
-    # Get the path portion and URL-decode it
-    path = unquote(parsed.path)
+    # Strip the file://[host] prefix and URL-decode the path portion
+    # (each decode step below is skipped when its marker character is absent)
+    path = FILE_URL_PREFIX.sub('', itunes_location, count=1)
+    if '%' in path:
+        path = unquote(path)
 
     # Decode XML/HTML entities (e.g., &#38; -> &, &#39; -> ')
     # iTunes Library.xml uses these for special characters
-    path = html.unescape(path)
+    if '&' in path:
+        path = html.unescape(path)
 
     # Normalize Unicode (macOS NFD -> NFC)
     path = normalize_unicode(path)
@@ -262,120 +477,174 @@ def extract_path_from_itunes_location(itunes_location: str) -> str:
         path = path[1:]
 
     # Normalize path separators to forward slashes
-    path = path.replace('\\', '/')
+    if '\\' in path:
+        path = path.replace('\\', '/')
 
     return path
 
 
+# A Navidrome media file as stored in the path index and returned by
+# find_matching_media_file (the index entry itself, not a copy)
+MediaFile = namedtuple('MediaFile', 'id path album_id artist_id duration')
+
+
 def build_navidrome_path_index(conn: sqlite3.Connection) -> dict:
     """
     Build an index of Navidrome media files for efficient suffix matching.
 
     Returns a dictionary where:
-    - Keys are normalized path suffixes (e.g., "Artist/Album/Track.mp3")
-    - Values are lists of (media_file_id, full_path, album_id, artist_id) tuples
-
-    We index by progressively longer suffixes to enable efficient matching.
+    - Keys are lowercased filenames (e.g., "track.mp3")
+    - Values are lists of (lowercased_path, MediaFile)
+
+    Each file is stored once, under its filename. Longer suffixes are checked
+    against the (usually one or two) candidates at match time, which keeps the
+    index linear in the number of files rather than in total path depth.
+    The media_file table is read exactly once; all per-track lookups afterwards
+    are dictionary probes with no SQL round-trips.
     """
     cursor = conn.cursor()
-    cursor.execute("SELECT id, path, album_id, artist_id FROM media_file")
+    cursor.execute("SELECT id, path, album_id, artist_id, duration FROM media_file")
 
-    # Build index by filename and by path components
+    by_filename = {}        # filename -> [(lower_path, MediaFile), ...]
     index = {
-        'by_filename': defaultdict(list),      # filename -> [(id, path, album_id, artist_id), ...]
-        'by_suffix': defaultdict(list),         # path_suffix -> [(id, path, album_id, artist_id), ...]
-        'all_files': []                         # all files for fallback
+        'by_filename': by_filename,
+        'resolved': {},         # itunes_path -> (MediaFile or None, ambiguous paths or None)
     }
 
+    # Bound once: the loop below runs for every media file in the library
+    get_files = by_filename.get
+    normalize = normalize_unicode
+
+    # sqlite3 returns a fresh string for every album_id/artist_id it reads;
+    # routing them through one dict makes all files of an album (or artist)
+    # share a single string object instead of holding a copy each
+    share_id = {}.setdefault
+
     row_count = 0
-    for row in cursor.fetchall():
-        file_id, path, album_id, artist_id = row
+    # Iterate the cursor directly rather than fetchall() so the full result set
+    # is never materialized as a second list alongside the index
+    for file_id, path, album_id, artist_id, duration in cursor:
         row_count += 1
 
-        # Normalize the path
-        normalized_path = normalize_unicode(path)
-        if normalized_path is None:
+        if path is None:
             continue
 
-        file_info = (file_id, normalized_path, album_id, artist_id)
-        index['all_files'].append(file_info)
+        # Normalize the path. Non-ASCII paths are normalized per component:
+        # files of one album share their artist/album directory names, so the
+        # memoized normalizer only does real work once per distinct name
+        if path.isascii():
+            normalized_path = path
+        else:
+            normalized_path = '/'.join([normalize(part) for part in path.split('/')])
+
+        file_info = MediaFile(file_id, normalized_path,
+                              share_id(album_id, album_id), share_id(artist_id, artist_id),
+                              duration)
+
+        # Index by filename (last path component)
+        lower_path = normalized_path.replace('\\', '/').lower()
+        filename = lower_path.rsplit('/', 1)[-1]
+        files = get_files(filename)
+        if files is None:
+            by_filename[filename] = [(lower_path, file_info)]
+        else:
+            files.append((lower_path, file_info))
 
-        # Split path into components
-        parts = normalized_path.replace('\\', '/').split('/')
+    logger.info(f"Indexed {row_count} media files from Navidrome")
+    return index
 
-        # Index by filename (last component)
-        filename = parts[-1].lower()
-        index['by_filename'][filename].append(file_info)
 
-        # Index by progressively longer suffixes (from right to left)
-        # e.g., "Track.mp3", "Album/Track.mp3", "Artist/Album/Track.mp3"
-        for i in range(len(parts)):
-            suffix = '/'.join(parts[i:]).lower()
-            index['by_suffix'][suffix].append(file_info)
+def path_match_parts(itunes_path: str) -> list:
+    """
+    Lowercase and split an iTunes path for suffix matching.
+
+    The path comes from extract_path_from_itunes_location, which has already
+    NFC-normalized it and converted backslashes, so only case folding is left.
+    """
+    return itunes_path.lower().split('/')
 
-    logger.info(f"Indexed {row_count} media files from Navidrome")
-    return index
 
+def resolve_media_file(itunes_path: str, by_filename: dict):
+    """
+    Run the suffix match for one iTunes path (see find_matching_media_file).
+
+    Returns:
+        (MediaFile or None, list of all candidate paths if the match was
+        ambiguous, else None)
+    """
+    # Every suffix below is joined from the already-folded components
+    parts = path_match_parts(itunes_path)
+
+    # Start with just the filename
+    i = len(parts) - 1
+    suffix = parts[i]
+    candidates = by_filename.get(suffix)
+    if not candidates:
+        return None, None
 
-def find_matching_media_file(itunes_path: str, index: dict, ambiguous_matches: list = None) -> dict:
+    while True:
+        if len(candidates) == 1:
+            # Unique match found
+            return candidates[0][1], None
+
+        if i == 0:
+            # We've tried the full path and still have multiple matches;
+            # return the first match as a fallback
+            return candidates[0][1], [c[1].path for c in candidates]
+
+        # Multiple matches: add the parent directory and narrow the candidates
+        # to those whose path ends with the longer suffix (whole components)
+        i -= 1
+        suffix = parts[i] + '/' + suffix
+        tail = '/' + suffix
+        candidates = [c for c in candidates if c[0] == suffix or c[0].endswith(tail)]
+        if not candidates:
+            # No match found
+            return None, None
+
+
+def find_matching_media_file(itunes_path: str, index: dict, ambiguous_matches: list = None) -> MediaFile:
     """
     Find a matching media file in Navidrome using suffix matching.
 
     The algorithm:
     1. Extract path components from the iTunes path
-    2. Try to match progressively longer suffixes against the Navidrome index
-    3. Return the match if exactly one file matches a suffix
-    4. If multiple matches, try a longer suffix
-    5. Fall back to filename-only matching if needed
-
-    If ambiguous_matches list is provided and multiple indistinguishable matches
-    are found, the iTunes path and all matching Navidrome paths are appended.
+    2. Look up the Navidrome files with the same filename
+    3. Return the match if exactly one file matches the current suffix
+    4. If multiple matches, extend the suffix by one parent directory and
+       keep only the candidates that still match
+    5. If the full iTunes path still matches several files, use the first
+
+    itunes_path must come from extract_path_from_itunes_location (NFC, forward
+    slashes). If ambiguous_matches list is provided and multiple
+    indistinguishable matches are found, the iTunes path and all matching
+    Navidrome paths are appended.
+
+    Results are kept in index['resolved'], so the sample, play data,
+    date-added and playlist passes match each distinct path only once.
     """
     if not itunes_path:
         return None
 
-    # Normalize and split the iTunes path
-    normalized_path = normalize_unicode(itunes_path)
-    parts = normalized_path.replace('\\', '/').split('/')
-
-    # Try matching from the filename up to longer suffixes
-    # Start with just filename, then add parent directories
-    for i in range(len(parts) - 1, -1, -1):
-        suffix = '/'.join(parts[i:]).lower()
-
-        if suffix in index['by_suffix']:
-            matches = index['by_suffix'][suffix]
-
-            if len(matches) == 1:
-                # Unique match found
-                match = matches[0]
-                return {
-                    'id': match[0],
-                    'path': match[1],
-                    'album_id': match[2],
-                    'artist_id': match[3]
-                }
-            elif len(matches) > 1 and i == 0:
-                # We've tried the full path and still have multiple matches
-                logger.debug(f"Multiple matches for full path suffix: {suffix}")
-
-                # Log ambiguous matches if list provided
-                if ambiguous_matches is not None:
-                    ambiguous_entry = [itunes_path] + [m[1] for m in matches]
-                    ambiguous_matches.append(ambiguous_entry)
-
-                # Return the first match as a fallback
-                match = matches[0]
-                return {
-                    'id': match[0],
-                    'path': match[1],
-                    'album_id': match[2],
-                    'artist_id': match[3]
-                }
-            # If multiple matches, continue to try a longer suffix
-
-    # No match found
-    return None
+    resolved = index['resolved'].get(itunes_path)
+    if resolved is None:
+        resolved = resolve_media_file(itunes_path, index['by_filename'])
+        index['resolved'][itunes_path] = resolved
+
+    media_file, ambiguous_paths = resolved
+    if ambiguous_paths:
+        logger.debug("Multiple matches for full path: %s", itunes_path)
+
+        # Log ambiguous matches if list provided
+        if ambiguous_matches is not None:
+            ambiguous_matches.append([itunes_path] + ambiguous_paths)
+
+    return media_file
+
+
+# Navidrome stars for every in-range iTunes rating (0-100), precomputed so
+# the per-track conversion is a tuple index
+RATING_STARS = tuple(min(5, max(1, rating // 20)) if rating else 0 for rating in range(101))
 
 
 def convert_itunes_rating(itunes_rating: int) -> int:
@@ -384,8 +653,10 @@ def convert_itunes_rating(itunes_rating: int) -> int:
     iTunes: 0=unrated, 20=1star, 40=2star, 60=3star, 80=4star, 100=5star
     Navidrome: 0=unrated, 1-5=stars
     """
-    if itunes_rating is None or itunes_rating == 0:
+    if not itunes_rating:
         return 0
+    if 0 < itunes_rating <= 100:
+        return RATING_STARS[itunes_rating]
     return min(5, max(1, itunes_rating // 20))
 
 
@@ -399,11 +670,54 @@ def convert_itunes_date(itunes_date) -> str:
         return None
 
     if isinstance(itunes_date, datetime):
-        return itunes_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+        # Plain field formatting is much cheaper than strftime's format parsing
+        return (f"{itunes_date.year:04d}-{itunes_date.month:02d}-{itunes_date.day:02d}T"
+                f"{itunes_date.hour:02d}:{itunes_date.minute:02d}:{itunes_date.second:02d}Z")
 
     return None
 
 
+def tune_sqlite(conn: sqlite3.Connection, use_wal: bool = True) -> str:
+    """
+    Apply write-path PRAGMAs to the migration connection.
+
+    The migration issues tens of thousands of small writes inside a single
+    transaction, so journal churn and fsyncs dominate with SQLite's defaults.
+    WAL is skipped when use_wal is False (e.g. dry runs), since switching the
+    journal mode is persisted in the database file.
+
+    Returns:
+        The journal mode the database had before tuning, so main can put it
+        back with restore_journal_mode once the migration is done
+    """
+    prior_journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if use_wal:
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-200000")     # ~200 MiB page cache
+    conn.execute("PRAGMA mmap_size=268435456")    # 256 MiB memory-mapped I/O
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Keep dirty pages in memory until commit instead of spilling them to
+    # the database file mid-transaction
+    conn.execute("PRAGMA cache_spill=OFF")
+    return prior_journal_mode
+
+
+def restore_journal_mode(conn: sqlite3.Connection, journal_mode: str):
+    """
+    Switch the database back to the journal mode it had before tune_sqlite.
+
+    Leaving WAL needs exclusive access, so if Navidrome has the database open
+    the database is simply left in WAL (which Navidrome uses itself).
+    """
+    if journal_mode.lower() == 'wal':
+        return
+    try:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Could not restore journal mode '{journal_mode}': {e}")
+
+
 def get_annotation_columns(conn: sqlite3.Connection) -> list:
     """Get the column names from the annotation table to handle schema differences."""
     cursor = conn.cursor()
@@ -412,142 +726,377 @@ def get_annotation_columns(conn: sqlite3.Connection) -> list:
     return columns
 
 
-def update_or_insert_annotation(
+def annotation_supports_upsert(conn: sqlite3.Connection) -> bool:
+    """
+    Check whether annotation writes can use INSERT ... ON CONFLICT.
+
+    Requires SQLite 3.24+ and a UNIQUE index (or primary key) on exactly
+    (user_id, item_id, item_type) to serve as the conflict target.
+    """
+    if sqlite3.sqlite_version_info < (3, 24, 0):
+        return False
+
+    # One query over the pragma table-valued functions (SQLite 3.16+) instead
+    # of an index_info round-trip per unique index
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT 1 FROM pragma_index_list('annotation') AS il
+        WHERE il."unique"
+          AND (SELECT count(*) FROM pragma_index_info(il.name)) = 3
+          AND (SELECT count(*) FROM pragma_index_info(il.name)
+               WHERE name IN ('user_id', 'item_id', 'item_type')) = 3
+        LIMIT 1
+    """)
+    return cursor.fetchone() is not None
+
+
+def begin_transaction(conn: sqlite3.Connection):
+    """
+    Open the migration transaction if one isn't already open.
+
+    sqlite3 only opens transactions implicitly before INSERT/UPDATE/DELETE,
+    so schema changes made before the first write would otherwise be
+    committed on their own. Starting the transaction first makes them roll
+    back together with the writes.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+
+
+def ensure_annotation_lookup_index(conn: sqlite3.Connection) -> bool:
+    """
+    Create a (user_id, item_id, item_type) index for schemas that lack a unique one.
+
+    The index is created inside the migration transaction, so it is only
+    kept if the migration commits.
+
+    Returns:
+        True if the index was created, False if it already existed
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_annotation_user_item_type'"
+    ).fetchone()
+    if exists:
+        return False
+    begin_transaction(conn)
+    conn.execute("""
+        CREATE INDEX idx_annotation_user_item_type
+        ON annotation(user_id, item_id, item_type)
+    """)
+    return True
+
+
+def drop_annotation_indexes(conn: sqlite3.Connection) -> list:
+    """
+    Drop the annotation table's secondary indexes ahead of a bulk write (--fast-write).
+
+    Unique indexes (the ON CONFLICT target) and the lookup index from
+    ensure_annotation_lookup_index are kept, since the writes themselves
+    depend on them. The DROPs run inside the migration transaction (opened
+    here if needed), so a rollback brings the indexes back.
+
+    Returns:
+        List of (index_name, create_sql) for restore_annotation_indexes
+    """
+    unique_names = {row[1] for row in conn.execute("PRAGMA index_list(annotation)") if row[2]}
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'annotation' AND sql IS NOT NULL
+    """)
+    dropped = []
+    begin_transaction(conn)
+    for name, sql in cursor.fetchall():
+        if name in unique_names or name == 'idx_annotation_user_item_type':
+            continue
+        quoted_name = name.replace('"', '""')
+        conn.execute(f'DROP INDEX "{quoted_name}"')
+        dropped.append((name, sql))
+        logger.debug(f"Dropped annotation index: {name}")
+    return dropped
+
+
+def restore_annotation_indexes(conn: sqlite3.Connection, dropped: list):
+    """Recreate the indexes removed by drop_annotation_indexes that are still missing."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'annotation'")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name, sql in dropped:
+        if name not in existing:
+            conn.execute(sql)
+            logger.debug(f"Recreated annotation index: {name}")
+
+
+def annotation_merge_assignments(new_play_count: str, new_play_date: str, new_rating: str,
+                                 replace_mode: bool = False) -> str:
+    """
+    Build the SET clause that merges incoming values into an existing annotation.
+
+    The new_* arguments are the SQL expressions for the incoming values.
+    - Add mode (default): play counts are summed, a non-zero rating wins
+    - Replace mode: play count and rating are overwritten
+    - Both modes keep the newer play date
+    """
+    if replace_mode:
+        play_count_expr = new_play_count
+        rating_expr = new_rating
+    else:
+        play_count_expr = f"COALESCE(annotation.play_count, 0) + {new_play_count}"
+        rating_expr = (f"CASE WHEN {new_rating} > 0 THEN {new_rating} "
+                       f"ELSE COALESCE(annotation.rating, 0) END")
+
+    return f"""
+            play_count = {play_count_expr},
+            play_date = CASE
+                WHEN annotation.play_date IS NULL OR {new_play_date} > annotation.play_date
+                THEN {new_play_date} ELSE annotation.play_date END,
+            rating = {rating_expr}"""
+
+
+def build_annotation_insert_sql(has_rated_at: bool = False) -> str:
+    """
+    Build the plain INSERT for a new annotation.
+
+    Rows are bound as (user_id, item_id, item_type, play_count, play_date, rating).
+    """
+    # Handle schema differences (rated_at column added in newer versions)
+    if has_rated_at:
+        columns = "user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at, rated_at"
+        values = "?1, ?2, ?3, ?4, ?5, ?6, 0, NULL, CASE WHEN ?6 > 0 THEN ?5 END"
+    else:
+        columns = "user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at"
+        values = "?1, ?2, ?3, ?4, ?5, ?6, 0, NULL"
+
+    return f"""
+        INSERT INTO annotation ({columns})
+        VALUES ({values})"""
+
+
+def build_annotation_upsert_sql(replace_mode: bool = False, has_rated_at: bool = False) -> str:
+    """Build the INSERT ... ON CONFLICT statement used to write annotations."""
+    return build_annotation_insert_sql(has_rated_at) + """
+        ON CONFLICT (user_id, item_id, item_type) DO UPDATE SET""" + annotation_merge_assignments(
+        "excluded.play_count", "excluded.play_date", "excluded.rating", replace_mode
+    )
+
+
+def build_annotation_update_sql(replace_mode: bool = False) -> str:
+    """Build the UPDATE used when ON CONFLICT is unavailable (same row binding)."""
+    return """
+        UPDATE annotation SET""" + annotation_merge_assignments("?4", "?5", "?6", replace_mode) + """
+        WHERE user_id = ?1 AND item_id = ?2 AND item_type = ?3"""
+
+
+def get_existing_annotation_keys(conn: sqlite3.Connection, user_id: str) -> set:
+    """Return the (item_id, item_type) pairs that already have an annotation for user_id."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT item_id, item_type FROM annotation WHERE user_id = ?", (user_id,))
+    return set(cursor.fetchall())
+
+
+def write_annotations(
     conn: sqlite3.Connection,
-    user_id: str,
-    item_id: str,
-    item_type: str,
-    play_count: int,
-    play_date: str,
-    rating: int,
+    annotation_rows: dict,
     replace_mode: bool = False,
-    has_rated_at: bool = False
-):
-    """Update or insert an annotation record."""
+    has_rated_at: bool = False,
+    existing: set = None
+) -> int:
+    """
+    Flush the annotation rows collected by migrate_track, one executemany per
+    item type, and empty the pending lists so the caller can keep filling them.
+
+    Args:
+        conn: Database connection
+        annotation_rows: Dict of item_type -> list of row tuples
+        replace_mode: Overwrite play counts/ratings instead of adding to them
+        has_rated_at: Whether the annotation table has a rated_at column
+        existing: Set of (item_id, item_type) keys already in the table, from
+            get_existing_annotation_keys. None uses INSERT ... ON CONFLICT
+            (see annotation_supports_upsert); otherwise the rows are split
+            into a batched INSERT and a batched UPDATE and the set is kept
+            up to date across calls
+
+    Returns:
+        Number of rows written
+    """
     cursor = conn.cursor()
 
-    # Check if annotation exists
-    cursor.execute("""
-        SELECT play_count, play_date, rating
-        FROM annotation
-        WHERE user_id = ? AND item_id = ? AND item_type = ?
-    """, (user_id, item_id, item_type))
-
-    existing = cursor.fetchone()
-
-    if existing:
-        existing_play_count = existing[0] or 0
-        existing_play_date = existing[1]
-        existing_rating = existing[2] or 0
-
-        if replace_mode:
-            # Replace mode: use new values directly
-            new_play_count = play_count or 0
-            new_rating = rating or 0
-        else:
-            # Add mode (default): increment play count
-            new_play_count = existing_play_count + (play_count or 0)
-            # Use higher rating (or keep existing if new is 0)
-            new_rating = rating if rating > 0 else existing_rating
-
-        # Use newer play date
-        new_play_date = play_date
-        if existing_play_date and play_date:
-            if existing_play_date > play_date:
-                new_play_date = existing_play_date
-        elif existing_play_date:
-            new_play_date = existing_play_date
-
-        cursor.execute("""
-            UPDATE annotation
-            SET play_count = ?, play_date = ?, rating = ?
-            WHERE user_id = ? AND item_id = ? AND item_type = ?
-        """, (new_play_count, new_play_date, new_rating, user_id, item_id, item_type))
+    if existing is None:
+        upsert_sql = build_annotation_upsert_sql(replace_mode, has_rated_at)
     else:
-        # Insert new annotation
-        # Handle schema differences (rated_at column added in newer versions)
-        if has_rated_at:
-            rated_at = play_date if rating and rating > 0 else None
-            cursor.execute("""
-                INSERT INTO annotation (user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at, rated_at)
-                VALUES (?, ?, ?, ?, ?, ?, 0, NULL, ?)
-            """, (user_id, item_id, item_type, play_count or 0, play_date, rating or 0, rated_at))
+        update_sql = build_annotation_update_sql(replace_mode)
+        insert_sql = build_annotation_insert_sql(has_rated_at)
+
+    written = 0
+    for item_type, rows in annotation_rows.items():
+        if not rows:
+            continue
+        if existing is None:
+            cursor.executemany(upsert_sql, rows)
         else:
-            cursor.execute("""
-                INSERT INTO annotation (user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at)
-                VALUES (?, ?, ?, ?, ?, ?, 0, NULL)
-            """, (user_id, item_id, item_type, play_count or 0, play_date, rating or 0))
+            # The first row for a new item is inserted; any later rows for
+            # the same item merge into it, so inserts must run before updates
+            inserts = []
+            updates = []
+            for row in rows:
+                key = (row[1], item_type)
+                if key in existing:
+                    updates.append(row)
+                else:
+                    inserts.append(row)
+                    existing.add(key)
+            cursor.executemany(insert_sql, inserts)
+            cursor.executemany(update_sql, updates)
 
+        logger.debug("Wrote %d %s annotations", len(rows), item_type)
+        written += len(rows)
+        rows.clear()
 
-def migrate_track(
-    conn: sqlite3.Connection,
-    user_id: str,
+    return written
+
+
+# A track that matched a Navidrome media file, with its raw iTunes values
+# (filtered by the import options; conversions are left to the caller)
+TrackMatch = namedtuple('TrackMatch', 'itunes_path media_file play_count raw_rating raw_play_date')
+
+
+def match_track(
     itunes_track: dict,
     path_index: dict,
     stats: dict,
-    not_found_paths: list,
+    not_found_file: TextIO,
     ambiguous_matches: list,
-    import_options: ImportOptions,
-    replace_mode: bool = False,
-    has_rated_at: bool = False
+    play_data_keys: tuple
 ):
-    """Migrate a single track's metadata from iTunes to Navidrome."""
+    """
+    Find the Navidrome media file for a track that has something to migrate.
+
+    play_data_keys comes from ImportOptions.play_data_keys(), computed once
+    per run rather than re-checking the options on every track.
+
+    Shared by migrate_track and check_track_for_dry_run. Skipped and unmatched
+    tracks are counted in stats (and unmatched paths written to not_found_file).
+
+    Returns:
+        TrackMatch, or None if the track is skipped or not found
+    """
+
+    # Bind the dict lookup once; it runs up to four times per track
+    get = itunes_track.get
 
     # Get iTunes data
-    location = itunes_track.get('Location')
+    location = get('Location')
     if not location:
         stats['no_location'] += 1
-        return False
+        return None
 
-    # Get data based on import options
-    play_count = itunes_track.get('Play Count', 0) if import_options.import_play_counts else 0
-    rating = convert_itunes_rating(itunes_track.get('Rating', 0)) if import_options.import_ratings else 0
-    play_date = convert_itunes_date(itunes_track.get('Play Date UTC')) if import_options.import_play_dates else None
+    # Get raw data based on import options (conversions wait until the
+    # track is known to have something to migrate)
+    play_count_key, rating_key, play_date_key = play_data_keys
+    play_count = get(play_count_key, 0)
+    raw_rating = get(rating_key, 0)
+    raw_play_date = get(play_date_key)
 
     # Skip if no meaningful data to migrate (based on selected options)
-    if play_count == 0 and rating == 0 and play_date is None:
+    # An unset/zero iTunes rating is the only value that converts to 0
+    if play_count == 0 and not raw_rating and raw_play_date is None:
         stats['no_data'] += 1
-        return False
+        return None
 
     # Extract path from iTunes location
     itunes_path = extract_path_from_itunes_location(location)
     if not itunes_path:
         stats['path_error'] += 1
-        return False
+        return None
 
     # Find matching file in Navidrome using suffix matching
     media_file = find_matching_media_file(itunes_path, path_index, ambiguous_matches)
     if not media_file:
         stats['not_found'] += 1
-        logger.debug(f"NOT FOUND: {itunes_path}")
-        not_found_paths.append(itunes_path)
+        logger.debug("NOT FOUND: %s", itunes_path)
+        not_found_file.write(itunes_path + '\n')
+        return None
+
+    stats['matched'] += 1
+    return TrackMatch(itunes_path, media_file, play_count, raw_rating, raw_play_date)
+
+
+def add_to_annotation_totals(totals: dict, item_id: str, play_count: int, play_date: str, rating: int):
+    """
+    Fold one track's values into the running album/artist totals.
+
+    Mirrors how write_annotations merges rows in add mode - play counts are
+    summed, the newest play date is kept and a non-zero rating wins - so each
+    album and artist needs a single annotation row instead of one per track.
+    """
+    entry = totals.get(item_id)
+    if entry is None:
+        totals[item_id] = [play_count, play_date, rating]
+        return
+    entry[0] += play_count
+    if play_date is not None and (entry[1] is None or play_date > entry[1]):
+        entry[1] = play_date
+    if rating:
+        entry[2] = rating
+
+
+def annotation_rows_from_totals(user_id: str, annotation_totals: dict) -> dict:
+    """Turn the album/artist totals into row tuples for write_annotations."""
+    return {
+        item_type: [(user_id, item_id, item_type, play_count, play_date, rating)
+                    for item_id, (play_count, play_date, rating) in totals.items()]
+        for item_type, totals in annotation_totals.items()
+    }
+
+
+def migrate_track(
+    user_id: str,
+    itunes_track: dict,
+    path_index: dict,
+    stats: dict,
+    not_found_file: TextIO,
+    ambiguous_matches: list,
+    play_data_keys: tuple,
+    annotation_rows: dict,
+    annotation_totals: dict
+):
+    """
+    Migrate a single track's metadata from iTunes to Navidrome.
+
+    The track's annotation row is appended to annotation_rows['media_file'];
+    its album and artist values are folded into annotation_totals. Both are
+    written afterwards by write_annotations().
+    """
+    match = match_track(itunes_track, path_index, stats, not_found_file,
+                        ambiguous_matches, play_data_keys)
+    if match is None:
         return False
 
-    # Update annotations for media_file
-    update_or_insert_annotation(
-        conn, user_id, media_file['id'], 'media_file',
-        play_count, play_date, rating, replace_mode, has_rated_at
+    media_file = match.media_file
+    play_count = match.play_count
+    rating = convert_itunes_rating(match.raw_rating)
+    play_date = convert_itunes_date(match.raw_play_date)
+
+    # Queue annotations for media_file
+    annotation_rows['media_file'].append(
+        (user_id, media_file.id, 'media_file', play_count, play_date, rating)
     )
 
-    # Update annotations for album
+    # Aggregate annotations for album
     # NOTE: Album play counts are AGGREGATED from all tracks.
     # This means album play_count = sum of all track play_counts.
-    if media_file['album_id']:
-        update_or_insert_annotation(
-            conn, user_id, media_file['album_id'], 'album',
-            play_count, play_date, rating, replace_mode, has_rated_at
-        )
+    if media_file.album_id:
+        add_to_annotation_totals(annotation_totals['album'], media_file.album_id,
+                                 play_count, play_date, rating)
 
-    # Update annotations for artist
+    # Aggregate annotations for artist
     # NOTE: Same aggregation applies to artists.
-    if media_file['artist_id']:
-        update_or_insert_annotation(
-            conn, user_id, media_file['artist_id'], 'artist',
-            play_count, play_date, rating, replace_mode, has_rated_at
-        )
+    if media_file.artist_id:
+        add_to_annotation_totals(annotation_totals['artist'], media_file.artist_id,
+                                 play_count, play_date, rating)
 
-    stats['matched'] += 1
-    logger.debug(f"MATCHED: {itunes_path} -> {media_file['path']} (plays: {play_count}, rating: {rating})")
+    logger.debug("MATCHED: %s -> %s (plays: %s, rating: %s)",
+                 match.itunes_path, media_file.path, play_count, rating)
 
     return True
 
@@ -556,68 +1105,49 @@ def check_track_for_dry_run(
     itunes_track: dict,
     path_index: dict,
     stats: dict,
-    not_found_paths: list,
+    not_found_file: TextIO,
     ambiguous_matches: list,
-    import_options: ImportOptions
+    play_data_keys: tuple
 ):
-    """Check if a track would match during dry run (mirrors migrate_track logic)."""
-
-    location = itunes_track.get('Location')
-    if not location:
-        stats['no_location'] += 1
-        return
-
-    # Get data based on import options
-    play_count = itunes_track.get('Play Count', 0) if import_options.import_play_counts else 0
-    rating = convert_itunes_rating(itunes_track.get('Rating', 0)) if import_options.import_ratings else 0
-    play_date = itunes_track.get('Play Date UTC') if import_options.import_play_dates else None
-
-    if play_count == 0 and rating == 0 and play_date is None:
-        stats['no_data'] += 1
-        return
-
-    itunes_path = extract_path_from_itunes_location(location)
-    if not itunes_path:
-        stats['path_error'] += 1
-        return
-
-    media_file = find_matching_media_file(itunes_path, path_index, ambiguous_matches)
-    if media_file:
-        stats['matched'] += 1
-        logger.debug(f"WOULD MATCH: {itunes_path} -> {media_file['path']}")
-    else:
-        stats['not_found'] += 1
-        not_found_paths.append(itunes_path)
+    """Check if a track would match during dry run (same matching as migrate_track)."""
+    match = match_track(itunes_track, path_index, stats, not_found_file,
+                        ambiguous_matches, play_data_keys)
+    if match is not None:
+        logger.debug("WOULD MATCH: %s -> %s", match.itunes_path, match.media_file.path)
 
 
 # =============================================================================
 # Date Added Import Functions
 # =============================================================================
 
-def update_media_file_date_added(conn: sqlite3.Connection, media_file_id: str, date_added: str):
+UPDATE_DATE_ADDED_SQL = "UPDATE media_file SET created_at = ? WHERE id = ?"
+
+
+def update_media_file_date_added(cursor: sqlite3.Cursor, media_file_id: str, date_added: str):
     """
     Update media_file.created_at with iTunes 'Date Added' timestamp.
 
     Args:
-        conn: Database connection
+        cursor: Cursor reused across all date-added updates
         media_file_id: Navidrome media file ID
         date_added: ISO format datetime string
     """
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE media_file SET created_at = ? WHERE id = ?
-    """, (date_added, media_file_id))
+    cursor.execute(UPDATE_DATE_ADDED_SQL, (date_added, media_file_id))
 
 
 def migrate_date_added(
     conn: sqlite3.Connection,
     tracks: dict,
     path_index: dict,
-    dry_run: bool = False
+    dry_run: bool = False,
+    commit_every: int = 0
 ) -> dict:
     """
     Import 'Date Added' timestamps from iTunes to Navidrome.
 
+    If commit_every is non-zero, changes are committed after every that many
+    updated tracks instead of only at the end of the migration.
+
     Returns stats dict with counts.
     """
     stats = {
@@ -627,8 +1157,16 @@ def migrate_date_added(
         'not_found': 0
     }
 
+    cursor = conn.cursor()
+    total = 0
+    next_report = PROGRESS_INTERVAL
+
     for track in tracks.values():
-        stats['total'] += 1
+        total += 1
+        # Reported up front so tracks skipped below still count toward progress
+        if total == next_report:
+            logger.info(f"Processed {total} tracks...")
+            next_report += PROGRESS_INTERVAL
 
         # Get date added from iTunes
         date_added = track.get('Date Added')
@@ -659,13 +1197,14 @@ def migrate_date_added(
 
         # Update the date
         if not dry_run:
-            update_media_file_date_added(conn, media_file['id'], date_added_str)
+            update_media_file_date_added(cursor, media_file.id, date_added_str)
 
         stats['updated'] += 1
 
-        if stats['total'] % 500 == 0:
-            logger.info(f"Processed {stats['total']} tracks...")
+        if commit_every and not dry_run and stats['updated'] % commit_every == 0:
+            conn.commit()
 
+    stats['total'] = total
     return stats
 
 
@@ -673,95 +1212,109 @@ def migrate_date_added(
 # Playlist Import Functions
 # =============================================================================
 
-# Base62 characters for Navidrome ID generation (same as Navidrome uses)
-BASE62_CHARS = string.ascii_letters + string.digits
+# base64 emits '+' and '/' besides base62 characters; swap them for letters so
+# generated IDs stay base62 like Navidrome's
+BASE62_ALTCHARS = b'Az'
+
+INSERT_PLAYLIST_SQL = """
+    INSERT INTO playlist (id, name, comment, owner_id, public, song_count, duration, created_at, updated_at)
+    VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)
+"""
+
+INSERT_PLAYLIST_TRACK_SQL = "INSERT INTO playlist_tracks (id, playlist_id, media_file_id) VALUES (?, ?, ?)"
 
 
 def generate_playlist_id() -> str:
     """
     Generate a 22-character base62 ID like Navidrome uses.
 
-    Navidrome uses nanoid-style IDs with base62 encoding.
+    Navidrome uses nanoid-style IDs with base62 encoding. The ID is 17 random
+    bytes from os.urandom, base64-encoded and cut to 22 characters, which
+    avoids drawing each character separately.
     """
-    return ''.join(random.choices(BASE62_CHARS, k=22))
+    return base64.b64encode(os.urandom(17), BASE62_ALTCHARS)[:22].decode('ascii')
 
 
-def playlist_exists(conn: sqlite3.Connection, name: str, owner_id: str) -> bool:
-    """Check if a playlist with the given name already exists for the user."""
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id FROM playlist WHERE name = ? AND owner_id = ?
-    """, (name, owner_id))
-    return cursor.fetchone() is not None
+def playlist_timestamp() -> str:
+    """Format the current time for playlist created_at/updated_at."""
+    return datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
-def create_playlist(
-    conn: sqlite3.Connection,
+def get_existing_playlist_names(cursor: sqlite3.Cursor, owner_id: str) -> set:
+    """Get the names of all playlists the user already has, in one query."""
+    cursor.execute("SELECT name FROM playlist WHERE owner_id = ?", (owner_id,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def queue_playlist(
+    playlist_rows: list,
+    track_rows: list,
     name: str,
     owner_id: str,
-    media_file_ids: list,
+    media_files: list,
+    now: str,
     comment: str = ""
 ) -> str:
     """
-    Create a playlist and its track entries in Navidrome.
+    Build a playlist's record and track entries without writing them.
 
     Args:
-        conn: Database connection
+        playlist_rows: List to append the playlist row to
+        track_rows: List to append the playlist_tracks rows to
         name: Playlist name
         owner_id: Navidrome user ID
-        media_file_ids: List of media file IDs in order
+        media_files: List of MediaFile entries from the path index, in order
+        now: created/updated timestamp
         comment: Optional playlist comment/description
 
     Returns:
-        The created playlist ID
+        The new playlist ID
     """
-    cursor = conn.cursor()
     playlist_id = generate_playlist_id()
-    now = datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    # Calculate duration by summing track durations
-    if media_file_ids:
-        placeholders = ','.join('?' * len(media_file_ids))
-        cursor.execute(f"""
-            SELECT COALESCE(SUM(duration), 0) FROM media_file WHERE id IN ({placeholders})
-        """, media_file_ids)
-        total_duration = cursor.fetchone()[0] or 0
-    else:
-        total_duration = 0
 
-    # Insert playlist record
-    cursor.execute("""
-        INSERT INTO playlist (id, name, comment, owner_id, public, song_count, duration, created_at, updated_at)
-        VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)
-    """, (playlist_id, name, comment, owner_id, len(media_file_ids), total_duration, now, now))
+    # Calculate duration by summing track durations (read with the path index,
+    # so no query is needed here)
+    total_duration = sum(media_file.duration or 0 for media_file in media_files)
+
+    playlist_rows.append(
+        (playlist_id, name, comment, owner_id, len(media_files), total_duration, now, now))
 
-    # Insert playlist tracks with positions (id is the track order, 0-indexed)
-    for position, media_file_id in enumerate(media_file_ids):
-        cursor.execute("""
-            INSERT INTO playlist_tracks (id, playlist_id, media_file_id)
-            VALUES (?, ?, ?)
-        """, (position, playlist_id, media_file_id))
+    # Track positions (id is the track order, 0-indexed)
+    track_rows.extend(
+        (position, playlist_id, media_file.id) for position, media_file in enumerate(media_files))
 
     return playlist_id
 
 
+def write_playlists(cursor: sqlite3.Cursor, playlist_rows: list, track_rows: list):
+    """Insert queued playlist and playlist_tracks rows, one executemany each."""
+    cursor.executemany(INSERT_PLAYLIST_SQL, playlist_rows)
+    cursor.executemany(INSERT_PLAYLIST_TRACK_SQL, track_rows)
+
+
 def migrate_playlist(
-    conn: sqlite3.Connection,
+    playlist_rows: list,
+    track_rows: list,
     user_id: str,
     playlist: dict,
     path_index: dict,
     stats: dict,
+    existing_names: set,
+    now: str,
     dry_run: bool = False
 ) -> bool:
     """
     Import a single playlist from iTunes to Navidrome.
 
     Args:
-        conn: Database connection
+        playlist_rows: List the new playlist's row is queued on
+        track_rows: List the new playlist's track rows are queued on
         user_id: Navidrome user ID
         playlist: Playlist dict with 'name' and 'tracks' keys
         path_index: Navidrome path index for matching
         stats: Stats dict to update
+        existing_names: Names of the user's playlists; created names are added
+        now: created/updated timestamp shared by all playlists in the run
         dry_run: If True, don't make changes
 
     Returns:
@@ -771,53 +1324,54 @@ def migrate_playlist(
     tracks = playlist['tracks']
 
     # Check if playlist already exists
-    if not dry_run and playlist_exists(conn, name, user_id):
-        logger.warning(f"Playlist already exists, skipping: {name}")
+    if not dry_run and name in existing_names:
+        logger.warning("Playlist already exists, skipping: %s", name)
         stats['skipped_exists'] += 1
         return False
 
-    # Match tracks to Navidrome media files
-    media_file_ids = []
-    unmatched = []
-
-    for track in tracks:
-        location = track.get('Location')
-        if not location:
-            continue
-
-        itunes_path = extract_path_from_itunes_location(location)
-        if not itunes_path:
-            continue
-
-        media_file = find_matching_media_file(itunes_path, path_index)
-        if media_file:
-            media_file_ids.append(media_file['id'])
-        else:
-            unmatched.append(itunes_path)
+    # Match tracks to Navidrome media files: decode every location first, then
+    # look all the paths up in one pass
+    itunes_paths = [
+        itunes_path
+        for itunes_path in (
+            extract_path_from_itunes_location(location)
+            for location in (track.get('Location') for track in tracks)
+            if location
+        )
+        if itunes_path
+    ]
+    matched = [find_matching_media_file(itunes_path, path_index) for itunes_path in itunes_paths]
+    media_files = [media_file for media_file in matched if media_file]
+    unmatched = [
+        itunes_path
+        for itunes_path, media_file in zip(itunes_paths, matched)
+        if not media_file
+    ]
 
     # Skip if no tracks matched
-    if not media_file_ids:
-        logger.warning(f"No tracks matched for playlist: {name} ({len(tracks)} tracks)")
+    if not media_files:
+        logger.warning("No tracks matched for playlist: %s (%d tracks)", name, len(tracks))
         stats['skipped_no_tracks'] += 1
         return False
 
     # Log partial matches
     if unmatched:
-        logger.info(f"Playlist '{name}': {len(media_file_ids)}/{len(tracks)} tracks matched")
-        for path in unmatched[:5]:  # Log first 5 unmatched
-            logger.debug(f"  Unmatched: {path}")
+        logger.info("Playlist '%s': %d/%d tracks matched", name, len(media_files), len(tracks))
+        for path in itertools.islice(unmatched, 5):  # Log first 5 unmatched
+            logger.debug("  Unmatched: %s", path)
         if len(unmatched) > 5:
-            logger.debug(f"  ... and {len(unmatched) - 5} more unmatched tracks")
+            logger.debug("  ... and %d more unmatched tracks", len(unmatched) - 5)
 
-    # Create the playlist
+    # Queue the playlist; migrate_all_playlists writes all of them at the end
     if not dry_run:
-        create_playlist(conn, name, user_id, media_file_ids)
-        logger.info(f"Created playlist: {name} ({len(media_file_ids)} tracks)")
+        queue_playlist(playlist_rows, track_rows, name, user_id, media_files, now)
+        existing_names.add(name)
+        logger.info("Created playlist: %s (%d tracks)", name, len(media_files))
     else:
-        logger.info(f"Would create playlist: {name} ({len(media_file_ids)} tracks)")
+        logger.info("Would create playlist: %s (%d tracks)", name, len(media_files))
 
     stats['created'] += 1
-    stats['tracks_matched'] += len(media_file_ids)
+    stats['tracks_matched'] += len(media_files)
     stats['tracks_unmatched'] += len(unmatched)
 
     return True
@@ -852,8 +1406,20 @@ def migrate_all_playlists(
         'tracks_unmatched': 0
     }
 
+    cursor = conn.cursor()
+    # Fetched once up front instead of a SELECT per playlist
+    existing_names = get_existing_playlist_names(cursor, user_id)
+    # One timestamp for the whole import rather than a strftime per playlist
+    now = playlist_timestamp()
+    playlist_rows = []
+    track_rows = []
     for playlist in playlists:
-        migrate_playlist(conn, user_id, playlist, path_index, stats, dry_run)
+        migrate_playlist(playlist_rows, track_rows, user_id, playlist, path_index, stats,
+                         existing_names, now, dry_run)
+
+    # Every playlist and playlist track goes in with one executemany each
+    if playlist_rows:
+        write_playlists(cursor, playlist_rows, track_rows)
 
     return stats
 
@@ -864,28 +1430,24 @@ def print_path_samples(tracks: dict, path_index: dict, count: int = 5):
     print("SAMPLE PATH MATCHES (verify these look correct before proceeding)")
     print("="*80)
 
-    samples = 0
-    for _, track in tracks.items():
-        if samples >= count:
-            break
-
-        location = track.get('Location')
+    # Only show tracks with play data, stopping after the first `count`
+    samples = (
+        track for track in tracks.values()
+        if track.get('Location') and (track.get('Play Count', 0) > 0 or track.get('Rating', 0) > 0)
+    )
+    for track in itertools.islice(samples, count):
         play_count = track.get('Play Count', 0)
         rating = track.get('Rating', 0)
+        itunes_path = extract_path_from_itunes_location(track['Location'])
+        media_file = find_matching_media_file(itunes_path, path_index)
 
-        # Only show tracks with play data
-        if location and (play_count > 0 or rating > 0):
-            itunes_path = extract_path_from_itunes_location(location)
-            media_file = find_matching_media_file(itunes_path, path_index)
-
-            print(f"\niTunes:    {itunes_path}")
-            if media_file:
-                print(f"Navidrome: {media_file['path']}")
-                print(f"Status:    MATCHED (plays: {play_count}, rating: {rating})")
-            else:
-                print(f"Navidrome: NOT FOUND")
-                print(f"Status:    WILL BE SKIPPED")
-            samples += 1
+        print(f"\niTunes:    {itunes_path}")
+        if media_file:
+            print(f"Navidrome: {media_file.path}")
+            print(f"Status:    MATCHED (plays: {play_count}, rating: {rating})")
+        else:
+            print(f"Navidrome: NOT FOUND")
+            print(f"Status:    WILL BE SKIPPED")
 
     print("\n" + "="*80)
     sys.stdout.flush()  # Ensure output appears before subsequent log messages
@@ -923,6 +1485,47 @@ def print_summary(stats: dict, dry_run: bool, not_found_count: int, ambiguous_co
         print("Run without --dry-run to apply changes")
 
 
+def complete_path(text: str, state: int) -> str:
+    """
+    readline completer that expands file system paths.
+
+    readline calls this with state 0, 1, 2, ... until it returns None; the
+    directory is listed once at state 0 and later states index that list.
+    """
+    if state == 0:
+        # Escape the typed text so names containing [, ], ? or * match literally
+        matches = glob.glob(glob.escape(os.path.expanduser(text)) + '*')
+        complete_path.matches = [match + os.sep if os.path.isdir(match) else match
+                                 for match in matches]
+    matches = complete_path.matches
+    return matches[state] if state < len(matches) else None
+
+
+complete_path.matches = []
+
+
+def enable_path_completion():
+    """
+    Turn on line editing and Tab completion of file paths for input() prompts.
+
+    Does nothing when stdin isn't a terminal or readline isn't available
+    (e.g. on Windows).
+    """
+    if not sys.stdin.isatty():
+        return
+    try:
+        import readline
+    except ImportError:
+        return
+    # Only whitespace separates words, so paths complete as a whole
+    readline.set_completer_delims(' \t\n')
+    readline.set_completer(complete_path)
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')  # macOS system Python
+    else:
+        readline.parse_and_bind('tab: complete')
+
+
 def prompt_for_value(prompt: str, validator=None, default=None) -> str:
     """Prompt the user for a value with optional validation."""
     while True:
@@ -953,26 +1556,40 @@ def validate_file_exists(path: str) -> str:
     return None
 
 
-def find_navidrome_db(directory: str = ".") -> list:
+def scan_for_files(directory: str, suffix: str, priority_names: frozenset) -> list:
     """
-    Scan directory for potential Navidrome database files.
+    List the files in directory whose names end with suffix.
 
-    Returns list of paths to .db files, prioritizing 'navidrome.db'.
+    Files whose lowercased name is in priority_names come first. Unreadable
+    directories yield an empty list.
     """
-    db_files = []
+    priority_files = []
+    other_files = []
     try:
-        for filename in os.listdir(directory):
-            if filename.endswith('.db'):
-                filepath = os.path.join(directory, filename)
-                if os.path.isfile(filepath):
-                    # Prioritize navidrome.db by putting it first
-                    if filename.lower() == 'navidrome.db':
-                        db_files.insert(0, filepath)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(suffix) and entry.is_file():
+                    if entry.name.lower() in priority_names:
+                        priority_files.append(entry.path)
                     else:
-                        db_files.append(filepath)
+                        other_files.append(entry.path)
     except OSError:
         pass
-    return db_files
+    return priority_files + other_files
+
+
+# File names (lowercase) listed first by the scanners below
+NAVIDROME_DB_NAMES = frozenset(['navidrome.db'])
+ITUNES_XML_NAMES = frozenset(['itunes music library.xml', 'itunes library.xml', 'library.xml'])
+
+
+def find_navidrome_db(directory: str = ".") -> list:
+    """
+    Scan directory for potential Navidrome database files.
+
+    Returns list of paths to .db files, prioritizing 'navidrome.db'.
+    """
+    return scan_for_files(directory, '.db', NAVIDROME_DB_NAMES)
 
 
 def find_itunes_xml(directory: str = ".") -> list:
@@ -981,22 +1598,7 @@ def find_itunes_xml(directory: str = ".") -> list:
 
     Returns list of paths to .xml files, prioritizing common iTunes names.
     """
-    xml_files = []
-    priority_names = ['itunes music library.xml', 'itunes library.xml', 'library.xml']
-
-    try:
-        for filename in os.listdir(directory):
-            if filename.endswith('.xml'):
-                filepath = os.path.join(directory, filename)
-                if os.path.isfile(filepath):
-                    # Prioritize common iTunes library names
-                    if filename.lower() in priority_names:
-                        xml_files.insert(0, filepath)
-                    else:
-                        xml_files.append(filepath)
-    except OSError:
-        pass
-    return xml_files
+    return scan_for_files(directory, '.xml', ITUNES_XML_NAMES)
 
 
 def prompt_file_with_autoscan(
@@ -1062,15 +1664,24 @@ def prompt_file_with_autoscan(
         )
 
 
-def list_navidrome_users(db_path: str) -> list:
-    """List all users in the Navidrome database."""
+def list_navidrome_users(db) -> list:
+    """
+    List all users in the Navidrome database.
+
+    Args:
+        db: Path to the database, or an already open connection to reuse
+
+    Returns:
+        List of (id, user_name) tuples, empty if the users can't be read
+    """
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, user_name FROM user")
-        users = cursor.fetchall()
-        conn.close()
-        return users
+        if isinstance(db, sqlite3.Connection):
+            return db.execute("SELECT id, user_name FROM user").fetchall()
+        conn = sqlite3.connect(db)
+        try:
+            return conn.execute("SELECT id, user_name FROM user").fetchall()
+        finally:
+            conn.close()
     except Exception as e:
         logger.error(f"Error reading users: {e}")
         return []
@@ -1079,6 +1690,9 @@ def list_navidrome_users(db_path: str) -> list:
 def interactive_get_arguments(args):
     """Interactively prompt for any missing arguments with auto-scan support."""
 
+    if not args.navidrome_db or not args.itunes_xml:
+        enable_path_completion()
+
     # Navidrome database - auto-scan current directory
     if not args.navidrome_db:
         args.navidrome_db = prompt_file_with_autoscan(
@@ -1140,6 +1754,24 @@ def interactive_get_arguments(args):
 # Options Screen
 # =============================================================================
 
+def getch() -> str:
+    """Read a single character without requiring Enter (stdin must be in cbreak mode)."""
+    return sys.stdin.read(1)
+
+
+# ANSI escapes: clear the screen and move the cursor to the top-left corner
+CLEAR_SCREEN = '\x1b[2J\x1b[H'
+
+# Where the checkboxes are drawn: option i (in IMPORT_FLAGS order) has its
+# "X" at row OPTION_FIRST_ROW + OPTION_ROW_STEP * i, column 4 (1-based)
+OPTION_FIRST_ROW = 7
+OPTION_ROW_STEP = 3
+OPTIONS_SCREEN_HEIGHT = 24
+
+# Number keys that toggle each option on the options screen
+OPTION_KEYS = {str(number): flag for number, flag in enumerate(IMPORT_FLAGS, 1)}
+
+
 def display_options_screen() -> ImportOptions:
     """
     Display interactive options screen and return selected options.
@@ -1148,9 +1780,14 @@ def display_options_screen() -> ImportOptions:
     """
     options = ImportOptions()
 
+    if os.name == 'nt':
+        # An empty command turns on ANSI escape handling in the Windows console
+        os.system('')
+
     def clear_screen():
         """Clear terminal screen."""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        sys.stdout.write(CLEAR_SCREEN)
+        sys.stdout.flush()
 
     def draw_screen():
         """Draw the options screen."""
@@ -1196,85 +1833,86 @@ def display_options_screen() -> ImportOptions:
         print("  [A] Toggle all    [Enter] Continue    [Q] Quit")
         print("=" * 80)
 
+    def update_checkboxes(drawn: tuple, current: tuple):
+        """Rewrite only the checkboxes that changed since the screen was drawn."""
+        changes = [
+            f"\x1b[{OPTION_FIRST_ROW + OPTION_ROW_STEP * i};4H{'X' if selected else ' '}"
+            for i, (was_selected, selected) in enumerate(zip(drawn, current))
+            if was_selected != selected
+        ]
+        if changes:
+            # Save the cursor, patch the boxes, then put the cursor back
+            sys.stdout.write('\x1b7' + ''.join(changes) + '\x1b8')
+            sys.stdout.flush()
+
     def toggle_all():
         """Toggle all options on or off."""
         # If any option is off, turn all on. Otherwise turn all off.
-        all_on = (options.import_play_counts and options.import_ratings and
-                  options.import_play_dates and options.import_playlists and
-                  options.import_date_added)
-        if not all_on:
-            options.import_play_counts = True
-            options.import_ratings = True
-            options.import_play_dates = True
-            options.import_playlists = True
-            options.import_date_added = True
-        else:
-            options.import_play_counts = False
-            options.import_ratings = False
-            options.import_play_dates = False
-            options.import_playlists = False
-            options.import_date_added = False
-
-    # Try to use getch for single-key input, fall back to input() if not available
+        all_on = all(getattr(options, flag) for flag in IMPORT_FLAGS)
+        for flag in IMPORT_FLAGS:
+            setattr(options, flag, not all_on)
+
+    # Read single keys without Enter when stdin is a terminal that supports
+    # it, otherwise fall back to input()
+    use_getch = termios is not None and sys.stdin.isatty()
+
+    # Only patch the checkboxes in place when keys don't echo and the whole
+    # screen fits in the terminal, so the rows haven't scrolled
+    redraw_in_place = (use_getch and
+                       shutil.get_terminal_size().lines > OPTIONS_SCREEN_HEIGHT)
+    drawn = None  # Checkbox states on screen; None forces a full repaint
+
+    # Switch the terminal mode once for the whole screen rather than per key.
+    # cbreak (not raw) keeps newline translation for the output and lets
+    # Ctrl-C interrupt; the finally block restores the terminal either way.
+    if use_getch:
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
     try:
-        import termios
-        import tty
-
-        def getch():
-            """Read a single character without requiring Enter."""
-            fd = sys.stdin.fileno()
-            old_settings = termios.tcgetattr(fd)
-            try:
-                tty.setraw(fd)
-                ch = sys.stdin.read(1)
-            finally:
-                termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            return ch
-
-        use_getch = True
-    except ImportError:
-        use_getch = False
-
-    while True:
-        draw_screen()
+        while True:
+            current = tuple(getattr(options, flag) for flag in IMPORT_FLAGS)
+            if drawn is None or not redraw_in_place:
+                draw_screen()
+            else:
+                update_checkboxes(drawn, current)
+            drawn = current
 
+            if use_getch:
+                key = getch().lower()
+            else:
+                key = input("\nEnter choice: ").strip().lower()
+                if not key:
+                    key = '\r'  # Treat empty input as Enter
+
+            if key in OPTION_KEYS:
+                flag = OPTION_KEYS[key]
+                setattr(options, flag, not getattr(options, flag))
+            elif key == 'a':
+                toggle_all()
+            elif key in ('\r', '\n', ''):
+                # Enter key - proceed
+                any_selected = any(current)
+                if not any_selected:
+                    # No options selected - show message
+                    print("\nNo options selected. Please select at least one option.")
+                    if use_getch:
+                        print("Press any key to continue...")
+                        getch()
+                    else:
+                        input("Press Enter to continue...")
+                    drawn = None
+                    continue
+                break
+            elif key == 'q':
+                print("\nAborted.")
+                sys.exit(0)
+    except KeyboardInterrupt:
+        print("\nAborted.")
+        sys.exit(0)
+    finally:
         if use_getch:
-            key = getch().lower()
-        else:
-            key = input("\nEnter choice: ").strip().lower()
-            if not key:
-                key = '\r'  # Treat empty input as Enter
-
-        if key == '1':
-            options.import_play_counts = not options.import_play_counts
-        elif key == '2':
-            options.import_ratings = not options.import_ratings
-        elif key == '3':
-            options.import_play_dates = not options.import_play_dates
-        elif key == '4':
-            options.import_date_added = not options.import_date_added
-        elif key == '5':
-            options.import_playlists = not options.import_playlists
-        elif key == 'a':
-            toggle_all()
-        elif key in ('\r', '\n', ''):
-            # Enter key - proceed
-            any_selected = (options.import_play_counts or options.import_ratings or
-                           options.import_play_dates or options.import_playlists or
-                           options.import_date_added)
-            if not any_selected:
-                # No options selected - show message
-                print("\nNo options selected. Please select at least one option.")
-                if use_getch:
-                    print("Press any key to continue...")
-                    getch()
-                else:
-                    input("Press Enter to continue...")
-                continue
-            break
-        elif key == 'q':
-            print("\nAborted.")
-            sys.exit(0)
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
     # Clear screen before returning
     clear_screen()
@@ -1282,6 +1920,17 @@ def display_options_screen() -> ImportOptions:
     return options
 
 
+def positive_int(value: str) -> int:
+    """argparse type for options that take a count of 1 or more."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Migrate iTunes play counts, ratings, playlists, and dates to Navidrome',
@@ -1322,6 +1971,8 @@ Notes:
   - Album/artist play counts are aggregated from their tracks
   - Smart playlists are skipped (cannot be converted to static)
   - Existing playlists with same name are skipped
+  - Query planner statistics are refreshed before exit, so the first run
+    after a large import may take a moment longer to finish
         """
     )
 
@@ -1339,6 +1990,16 @@ Notes:
                         help='Skip confirmation prompt (for non-interactive use)')
     parser.add_argument('--sample', type=int, default=5,
                         help='Number of sample paths to show (default: 5)')
+    parser.add_argument('--no-wal', action='store_true',
+                        help='Do not switch the database to WAL journal mode')
+    parser.add_argument('--commit-every', type=positive_int, default=0, metavar='N',
+                        help='Commit after every N matched tracks instead of once at the end '
+                             '(a crash then leaves earlier batches applied)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Save the parsed iTunes library as Library.xml.pkl next to the XML '
+                             'and reuse it on later runs (written even with --dry-run)')
+    parser.add_argument('--fast-write', action='store_true',
+                        help='Drop secondary annotation indexes during the write and rebuild them afterwards')
 
     # New import options
     parser.add_argument('--import-play-counts', action='store_true',
@@ -1379,21 +2040,13 @@ Notes:
     # Determine import options
     # If specific import flags are set, use those directly (non-interactive)
     # Otherwise, show the options screen (unless --no-interactive)
-    any_import_flag = (args.import_play_counts or args.import_ratings or
-                       args.import_play_dates or args.import_playlists or
-                       args.import_date_added)
+    any_import_flag = any(getattr(args, flag) for flag in IMPORT_FLAGS)
 
     if any_import_flag or args.no_interactive:
         # CLI mode - use flags directly
         if any_import_flag:
             # Use exactly what was specified
-            import_options = ImportOptions(
-                import_play_counts=args.import_play_counts,
-                import_ratings=args.import_ratings,
-                import_play_dates=args.import_play_dates,
-                import_playlists=args.import_playlists,
-                import_date_added=args.import_date_added
-            )
+            import_options = ImportOptions(**{flag: getattr(args, flag) for flag in IMPORT_FLAGS})
         else:
             # --no-interactive with no specific flags: default to play counts/ratings/dates
             import_options = ImportOptions(
@@ -1416,28 +2069,50 @@ Notes:
 
     # Parse iTunes library (include playlists if needed)
     if import_options.import_playlists:
-        tracks, playlists = parse_itunes_library(args.itunes_xml, include_playlists=True)
+        tracks, playlists = parse_itunes_library(
+            args.itunes_xml, include_playlists=True, use_cache=args.cache
+        )
     else:
-        tracks = parse_itunes_library(args.itunes_xml)
+        tracks = parse_itunes_library(args.itunes_xml, use_cache=args.cache)
         playlists = []
 
     # Initialize stats variables (will be populated during migration)
     stats = {'total': 0, 'matched': 0, 'not_found': 0, 'no_location': 0, 'no_data': 0, 'path_error': 0}
     date_added_stats = None
     playlist_stats = None
-    not_found_paths = []
     ambiguous_matches = []
+    dropped_indexes = []
+
+    not_found_log = os.path.join(log_dir, 'not_found.log')
 
-    # Connect to Navidrome database
-    conn = sqlite3.connect(args.navidrome_db, isolation_level='DEFERRED')
+    # Set inside the try so the finally block only cleans up what was opened
+    not_found_file = None
+    conn = None
+    prior_journal_mode = None
 
     try:
+        # Unmatched paths are streamed to not_found.log as they are found rather
+        # than held in memory (a bad path setup can miss every track)
+        not_found_file = open(not_found_log, 'w', buffering=1 << 20)
+
+        # Connect to Navidrome database
+        # A larger statement cache keeps the per-playlist and per-track
+        # statements compiled across calls. Switching to WAL fails with
+        # "database is locked" while Navidrome is running
+        conn = sqlite3.connect(args.navidrome_db, isolation_level='DEFERRED', cached_statements=256)
+        prior_journal_mode = tune_sqlite(conn, use_wal=not (args.no_wal or args.dry_run))
+
         # Check annotation table schema for rated_at column
         annotation_columns = get_annotation_columns(conn)
         has_rated_at = 'rated_at' in annotation_columns
         logger.debug(f"Annotation columns: {annotation_columns}")
         logger.debug(f"Has rated_at column: {has_rated_at}")
 
+        # ON CONFLICT needs a unique (user_id, item_id, item_type) key;
+        # otherwise the UPDATE fallback is used (see the lookup index below)
+        use_upsert = annotation_supports_upsert(conn)
+        logger.debug(f"Annotation upsert supported: {use_upsert}")
+
         # Verify user exists
         cursor = conn.cursor()
         cursor.execute("SELECT user_name FROM user WHERE id = ?", (args.user_id,))
@@ -1445,9 +2120,8 @@ Notes:
         if not user_result:
             logger.error(f"User ID not found: {args.user_id}")
             logger.info("Available users:")
-            cursor.execute("SELECT id, user_name FROM user")
-            for row in cursor.fetchall():
-                logger.info(f"  ID: {row[0]}, Username: {row[1]}")
+            for user_id, username in list_navidrome_users(conn):
+                logger.info(f"  ID: {user_id}, Username: {username}")
             sys.exit(1)
 
         logger.info(f"Migrating to user: {user_result[0]} (ID: {args.user_id})")
@@ -1493,27 +2167,94 @@ Notes:
             print(f"\n--- Importing {', '.join(importing)} ---")
             logger.info(f"Starting migration of: {', '.join(importing)}...")
 
-            for _, track in tracks.items():
-                stats['total'] += 1
-
-                if not args.dry_run:
+            annotation_rows = {'media_file': []}
+            annotation_totals = {'album': {}, 'artist': {}}
+            written = 0
+
+            # Without ON CONFLICT, existing annotations are prefetched once and
+            # each flush is split into inserts and updates against this set
+            existing = None
+            if not use_upsert and not args.dry_run:
+                # Index the UPDATE fallback's lookups. Created only now that the
+                # run is confirmed, inside the migration transaction
+                if ensure_annotation_lookup_index(conn):
+                    logger.info("Created index idx_annotation_user_item_type on annotation "
+                                "(it stays in the database after the migration)")
+                existing = get_existing_annotation_keys(conn, args.user_id)
+
+            # Secondary indexes are rebuilt once below instead of being
+            # maintained row by row during the bulk write
+            if args.fast_write and not args.dry_run:
+                dropped_indexes = drop_annotation_indexes(conn)
+                logger.info(f"Dropped {len(dropped_indexes)} annotation indexes for the bulk write")
+
+            # Pending rows are flushed every flush_size tracks so memory stays
+            # bounded; with --commit-every each flush is also committed
+            flush_size = args.commit_every or ANNOTATION_BATCH_SIZE
+
+            # Loop-invariant lookups bound once outside the per-track loop
+            dry_run = args.dry_run
+            user_id = args.user_id
+            pending = annotation_rows['media_file']
+            play_data_keys = import_options.play_data_keys()
+
+            # Counted locally and stored in stats after the loop; progress is
+            # reported when the count reaches the next threshold
+            total = 0
+            next_report = PROGRESS_INTERVAL
+
+            for track in tracks.values():
+                total += 1
+
+                if not dry_run:
                     migrate_track(
-                        conn, args.user_id, track,
-                        path_index, stats, not_found_paths, ambiguous_matches,
-                        import_options=import_options,
-                        replace_mode=args.replace,
-                        has_rated_at=has_rated_at
+                        user_id, track,
+                        path_index, stats, not_found_file, ambiguous_matches,
+                        play_data_keys=play_data_keys,
+                        annotation_rows=annotation_rows,
+                        annotation_totals=annotation_totals
                     )
+                    if len(pending) >= flush_size:
+                        written += write_annotations(
+                            conn, annotation_rows,
+                            replace_mode=args.replace,
+                            has_rated_at=has_rated_at,
+                            existing=existing
+                        )
+                        if args.commit_every:
+                            conn.commit()
                 else:
                     # Dry run - use the same logic as migrate_track for accurate stats
                     check_track_for_dry_run(
-                        track, path_index, stats, not_found_paths, ambiguous_matches,
-                        import_options=import_options
+                        track, path_index, stats, not_found_file, ambiguous_matches,
+                        play_data_keys=play_data_keys
                     )
 
                 # Progress indicator
-                if stats['total'] % 500 == 0:
-                    logger.info(f"Processed {stats['total']} tracks...")
+                if total == next_report:
+                    logger.info(f"Processed {total} tracks...")
+                    next_report += PROGRESS_INTERVAL
+
+            stats['total'] = total
+
+            if not args.dry_run:
+                written += write_annotations(
+                    conn, annotation_rows,
+                    replace_mode=args.replace,
+                    has_rated_at=has_rated_at,
+                    existing=existing
+                )
+                # One row per album and artist, now that every track is summed
+                written += write_annotations(
+                    conn, annotation_rows_from_totals(user_id, annotation_totals),
+                    replace_mode=args.replace,
+                    has_rated_at=has_rated_at,
+                    existing=existing
+                )
+                if dropped_indexes:
+                    logger.info("Rebuilding annotation indexes...")
+                    restore_annotation_indexes(conn, dropped_indexes)
+                logger.info(f"Wrote {written} annotation records")
 
         # =====================================================================
         # 2. Date added timestamps
@@ -1522,7 +2263,8 @@ Notes:
             print("\n--- Importing Date Added ---")
             logger.info("Starting migration of: date added timestamps...")
             date_added_stats = migrate_date_added(
-                conn, tracks, path_index, dry_run=args.dry_run
+                conn, tracks, path_index, dry_run=args.dry_run,
+                commit_every=args.commit_every
             )
 
         # =====================================================================
@@ -1540,37 +2282,61 @@ Notes:
             conn.commit()
             logger.info("Changes committed to database")
 
+            # Refresh query planner statistics after the bulk writes so
+            # Navidrome's own annotation lookups keep choosing good indexes.
+            # The data is already committed, so a failure here (e.g. the
+            # database is locked by Navidrome) is only a warning
+            try:
+                conn.execute("PRAGMA analysis_limit=1000")
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update query planner statistics: {e}")
+
     except Exception as e:
         logger.error(f"Error during migration: {e}")
-        if not args.dry_run:
+        if not args.dry_run and conn is not None:
             logger.info("Rolling back changes...")
             conn.rollback()
         raise
 
     finally:
-        conn.close()
-
-    # Write not_found.log once at the end (much more efficient than per-track)
-    not_found_log = os.path.join(log_dir, 'not_found.log')
-    if not_found_paths:
-        with open(not_found_log, 'w') as f:
-            f.write('\n'.join(not_found_paths) + '\n')
+        if dropped_indexes:
+            # Runs on every way out, including Ctrl-C and sys.exit. Rolling back
+            # undoes uncommitted DROPs; indexes whose DROP a --commit-every
+            # batch already committed are recreated. On success this is a no-op
+            try:
+                conn.rollback()
+                restore_annotation_indexes(conn, dropped_indexes)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not restore annotation indexes: {e}")
+        if conn is not None:
+            if prior_journal_mode is not None:
+                restore_journal_mode(conn, prior_journal_mode)
+            conn.close()
+
+        if not_found_file is not None:
+            not_found_file.close()
+            if not stats['not_found']:
+                os.remove(not_found_log)
 
     # Write ambiguous_matches.log for tracks with multiple indistinguishable matches
     # Format: iTunes path, then each Navidrome match, with blank line between entries
     ambiguous_log = os.path.join(log_dir, 'ambiguous_matches.log')
     if ambiguous_matches:
-        with open(ambiguous_log, 'w') as f:
-            entries = []
-            for match_group in ambiguous_matches:
-                # match_group is [itunes_path, navidrome_path1, navidrome_path2, ...]
-                entries.append('\n'.join(match_group))
-            f.write('\n\n'.join(entries) + '\n')
-
-    # Print and log summary
-    log_and_print("\n" + "=" * 80)
-    log_and_print("MIGRATION SUMMARY")
-    log_and_print("=" * 80)
+        with open(ambiguous_log, 'w', buffering=1 << 20) as f:
+            # match_group is [itunes_path, navidrome_path1, navidrome_path2, ...];
+            # entries are written one at a time rather than joined into one string
+            for i, match_group in enumerate(ambiguous_matches):
+                if i:
+                    f.write('\n')
+                f.write('\n'.join(match_group) + '\n')
+
+    # Collect the summary, then print and log it in one go
+    summary = []
+    summary.append("\n" + "=" * 80)
+    summary.append("MIGRATION SUMMARY")
+    summary.append("=" * 80)
 
     # Play counts/ratings/play dates summary
     if import_options.import_play_counts or import_options.import_ratings or import_options.import_play_dates:
@@ -1582,51 +2348,53 @@ Notes:
             imported_items.append("Ratings")
         if import_options.import_play_dates:
             imported_items.append("Play Dates")
-        log_and_print(f"\n--- {', '.join(imported_items)} ---")
-        log_and_print(f"Total tracks in iTunes:     {stats['total']}")
-        log_and_print(f"Successfully matched:       {stats['matched']}")
-        log_and_print(f"Not found in Navidrome:     {stats['not_found']}")
-        log_and_print(f"No location in iTunes:      {stats['no_location']}")
-        log_and_print(f"No data to migrate:         {stats['no_data']}")
-        log_and_print(f"Path conversion errors:     {stats['path_error']}")
-        log_and_print(f"Ambiguous matches:          {len(ambiguous_matches)}")
+        summary.append(f"\n--- {', '.join(imported_items)} ---")
+        summary.append(f"Total tracks in iTunes:     {stats['total']}")
+        summary.append(f"Successfully matched:       {stats['matched']}")
+        summary.append(f"Not found in Navidrome:     {stats['not_found']}")
+        summary.append(f"No location in iTunes:      {stats['no_location']}")
+        summary.append(f"No data to migrate:         {stats['no_data']}")
+        summary.append(f"Path conversion errors:     {stats['path_error']}")
+        summary.append(f"Ambiguous matches:          {len(ambiguous_matches)}")
 
         # Calculate match rate based on tracks that actually have data to migrate
         tracks_with_data = stats['total'] - stats['no_location'] - stats['no_data']
         if tracks_with_data > 0:
             match_rate = (stats['matched'] / tracks_with_data) * 100
-            log_and_print(f"Match rate (tracks w/data): {match_rate:.1f}%")
+            summary.append(f"Match rate (tracks w/data): {match_rate:.1f}%")
 
     # Date added summary
     if import_options.import_date_added and date_added_stats:
-        log_and_print("\n--- Date Added Timestamps ---")
-        log_and_print(f"Total tracks processed:     {date_added_stats['total']}")
-        log_and_print(f"Timestamps updated:         {date_added_stats['updated']}")
-        log_and_print(f"No date in iTunes:          {date_added_stats['no_date']}")
-        log_and_print(f"Not found in Navidrome:     {date_added_stats['not_found']}")
+        summary.append("\n--- Date Added Timestamps ---")
+        summary.append(f"Total tracks processed:     {date_added_stats['total']}")
+        summary.append(f"Timestamps updated:         {date_added_stats['updated']}")
+        summary.append(f"No date in iTunes:          {date_added_stats['no_date']}")
+        summary.append(f"Not found in Navidrome:     {date_added_stats['not_found']}")
 
     # Playlist summary
     if import_options.import_playlists and playlist_stats:
-        log_and_print("\n--- Playlists ---")
-        log_and_print(f"Total playlists found:      {playlist_stats['total']}")
-        log_and_print(f"Playlists created:          {playlist_stats['created']}")
-        log_and_print(f"Skipped (already exists):   {playlist_stats['skipped_exists']}")
-        log_and_print(f"Skipped (no tracks found):  {playlist_stats['skipped_no_tracks']}")
-        log_and_print(f"Total tracks matched:       {playlist_stats['tracks_matched']}")
-        log_and_print(f"Total tracks unmatched:     {playlist_stats['tracks_unmatched']}")
+        summary.append("\n--- Playlists ---")
+        summary.append(f"Total playlists found:      {playlist_stats['total']}")
+        summary.append(f"Playlists created:          {playlist_stats['created']}")
+        summary.append(f"Skipped (already exists):   {playlist_stats['skipped_exists']}")
+        summary.append(f"Skipped (no tracks found):  {playlist_stats['skipped_no_tracks']}")
+        summary.append(f"Total tracks matched:       {playlist_stats['tracks_matched']}")
+        summary.append(f"Total tracks unmatched:     {playlist_stats['tracks_unmatched']}")
 
-    log_and_print(f"\nLogs saved to: {log_dir}/")
+    summary.append(f"\nLogs saved to: {log_dir}/")
 
-    if len(not_found_paths) > 0:
-        log_and_print(f"  - not_found.log ({len(not_found_paths)} unmatched tracks)")
+    if stats['not_found'] > 0:
+        summary.append(f"  - not_found.log ({stats['not_found']} unmatched tracks)")
 
     if len(ambiguous_matches) > 0:
-        log_and_print(f"  - ambiguous_matches.log ({len(ambiguous_matches)} tracks with multiple possible matches)")
+        summary.append(f"  - ambiguous_matches.log ({len(ambiguous_matches)} tracks with multiple possible matches)")
 
     if args.dry_run:
-        log_and_print("\n*** This was a DRY RUN - no changes were made ***")
-        log_and_print("Run without --dry-run to apply changes")
-    log_and_print("=" * 80)
+        summary.append("\n*** This was a DRY RUN - no changes were made ***")
+        summary.append("Run without --dry-run to apply changes")
+    summary.append("=" * 80)
+
+    log_and_print_lines(summary)
 
 
 if __name__ == '__main__':